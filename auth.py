@@ -3,11 +3,11 @@ import sys
 from playwright.sync_api import sync_playwright, Page, TimeoutError
 from dotenv import load_dotenv
 
-# --- Login Function (Saves auth after a fixed wait) ---
+# --- Login Function (Saves auth once the session is stored) ---
 def perform_login(page: Page, username: str, password: str, auth_file_path: str):
     """
-    Handles the first-time login and saves the auth state after a fixed wait,
-    as instructed, to avoid getting stuck.
+    Handles the first-time login and saves the auth state as soon as Typefully
+    has written its session to localStorage.
     """
     print("\n--- Auth file not found. Starting first-time login process... ---")
     page.goto("https://typefully.com/", wait_until="domcontentloaded")
@@ -39,9 +39,9 @@ def perform_login(page: Page, username: str, password: str, auth_file_path: str)
     popup_page.wait_for_event("close", timeout=60000)
     print("...Popup closed.")
     
-    # Instead of waiting for a flaky selector, we wait for a fixed period.
-    print("Authorization complete. Waiting for a fixed 3 seconds for the main page to process the login...")
-    page.wait_for_timeout(3000)
+    # Typefully keeps its session in localStorage; wait for it to be written.
+    print("Authorization complete. Waiting for the main page to store the session...")
+    page.wait_for_function("() => window.localStorage.getItem('writhread:auth') !== null", timeout=15000)
     
     # Save the session state immediately and move on.
     print(f"Saving reusable authentication state to '{auth_file_path}' NOW.")
@@ -1,101 +1,209 @@
 import os
 import io
+import json
 import sys
 import logging
+import mimetypes
+import random
+import re
+import threading
+import time
+from urllib.parse import urlparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from playwright.sync_api import sync_playwright, TimeoutError
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.service_account import Credentials
-from urllib.parse import urlparse
+from google_auth_httplib2 import AuthorizedHttp
+import httplib2
 from dotenv import load_dotenv
 from retrying import retry
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Load environment variables
+load_dotenv()
+
+# Configure logging (set LOG_LEVEL=DEBUG for per-chunk download progress)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Suppress file_cache warning
 logging.getLogger('googleapiclient.discovery_cache').setLevel(logging.ERROR)
 
-# Load environment variables
-load_dotenv()
+# Large enough that typical tweet images download in a single request
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Drive requests retry 429/5xx and connection errors with randomized exponential
+# backoff; a stalled socket fails after the timeout, and a multi-chunk download
+# gives up once it exceeds the deadline
+DRIVE_NUM_RETRIES = 4
+DRIVE_SOCKET_TIMEOUT_SECONDS = 30
+DOWNLOAD_DEADLINE_SECONDS = 60
+
+# Chromium flags for a headless, non-interactive run inside the container
+CHROMIUM_ARGS = [
+    "--disable-blink-features=AutomationControlled",
+    "--disable-dev-shm-usage",
+    "--no-sandbox",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-features=Translate,BackForwardCache",
+]
+
+# Analytics and support widgets are never needed to drive the editor; hosts
+# match themselves and their subdomains
+BLOCKED_HOSTS = (
+    "googletagmanager.com", "google-analytics.com", "sentry.io", "hotjar.com",
+    "segment.io", "segment.com", "intercom.io", "intercomcdn.com",
+)
+# Third-party resources of these types are not needed either; stylesheets are
+# kept because the editor depends on them
+BLOCKED_RESOURCE_TYPES = {"font", "image", "media"}
+
+# Editor selectors, built once and reused for every post
+MEDIA_BUTTON_SELECTOR = 'button:has(svg > rect[x="3"])'
+ADD_TWEET_BUTTON_SELECTOR = 'button:has(svg > path[d="M4 5H20"])'
+TEXT_AREA_SELECTOR = 'div[data-node-view-content]'
+
+# "Post text [image.jpg]" -> ("Post text", "image.jpg")
+POST_RE = re.compile(r'^(.*?)\[([^\]]+)\]\s*$', re.S)
 
 # Custom exception for login failures
 class LoginError(Exception):
     pass
 
+# Custom exception for failures while preparing or posting a thread
+class PostingError(Exception):
+    pass
+
+@lru_cache(maxsize=1)
+def _drive_credentials():
+    """Load the service account credentials once; every thread shares them."""
+    credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
+    if not credentials_path or not os.path.exists(credentials_path):
+        logger.error(f"Credentials file not found: {credentials_path}")
+        raise FileNotFoundError(f"Credentials file not found: {credentials_path}")
+
+    scopes = ['https://www.googleapis.com/auth/drive']
+    return Credentials.from_service_account_file(credentials_path, scopes=scopes)
+
+@lru_cache(maxsize=1)
 def get_drive_service():
-    """Create Google Drive service with service account credentials."""
+    """Create (once) a Google Drive service with service account credentials."""
     try:
-        credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
-        if not credentials_path or not os.path.exists(credentials_path):
-            logger.error(f"Credentials file not found: {credentials_path}")
-            raise FileNotFoundError(f"Credentials file not found: {credentials_path}")
-
-        scopes = ['https://www.googleapis.com/auth/drive']
-        credentials = Credentials.from_service_account_file(credentials_path, scopes=scopes)
-        return build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        http = AuthorizedHttp(_drive_credentials(), http=httplib2.Http(timeout=DRIVE_SOCKET_TIMEOUT_SECONDS))
+        return build('drive', 'v3', http=http, cache_discovery=False, static_discovery=True)
     except Exception as e:
         logger.error(f"Failed to authenticate with service account: {str(e)}")
         raise
 
-def check_gdrive_file_exists(folder_url: str, filename: str, drive_service) -> bool:
-    """Check if a file exists in the specified Google Drive folder."""
+# One keep-alive connection per download thread, reused across downloads
+_thread_local = threading.local()
+
+def _thread_http():
+    """Return this thread's authorized HTTP client (httplib2 is not thread-safe)."""
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        http = AuthorizedHttp(_drive_credentials(), http=httplib2.Http(timeout=DRIVE_SOCKET_TIMEOUT_SECONDS))
+        _thread_local.http = http
+    return http
+
+# Drive folder URLs look like https://drive.google.com/drive/folders/<folder_id>
+FOLDER_ID_RE = re.compile(r'/folders/([A-Za-z0-9_-]{10,})')
+
+@lru_cache(maxsize=None)
+def _parse_folder_id(folder_url: str) -> str | None:
+    """Extract the folder ID from a Google Drive folder URL, or None if malformed."""
+    match = FOLDER_ID_RE.search(folder_url)
+    return match.group(1) if match else None
+
+def find_gdrive_files(folder_url: str, filenames, drive_service) -> dict[str, str] | None:
+    """Map filenames to file IDs in a Google Drive folder using a single list call."""
     try:
-        parsed = urlparse(folder_url)
-        folder_id = parsed.path.strip('/').split('/')[-1]
-        if not folder_id or folder_id == 'folders':
+        folder_id = _parse_folder_id(folder_url)
+        if not folder_id:
             logger.error(f"Invalid folder URL: {folder_url}")
-            return False
-
-        query = f"'{folder_id}' in parents and name = '{filename}' and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
-        if not files:
-            logger.error(f"File '{filename}' not found in folder ID '{folder_id}'")
-            return False
-        return True
+            return None
+
+        filenames = set(filenames)
+        if not filenames:
+            return {}
+
+        name_query = " or ".join(
+            "name = '{}'".format(name.replace("\\", "\\\\").replace("'", "\\'")) for name in filenames
+        )
+        query = f"'{folder_id}' in parents and trashed = false and ({name_query})"
+        # Only ids and names come back; a name query never spans pages in practice
+        results = drive_service.files().list(
+            q=query, spaces="drive", fields="files(id,name)", pageSize=1000
+        ).execute(num_retries=DRIVE_NUM_RETRIES)
+        return {f['name']: f['id'] for f in results.get('files', []) if f['name'] in filenames}
     except Exception as e:
-        logger.error(f"Error checking file '{filename}' in Google Drive: {str(e)}")
-        return False
+        logger.error(f"Error looking up files in Google Drive: {str(e)}")
+        return None
 
-def download_gdrive_file(folder_url: str, filename: str, output_path: str, drive_service) -> bool:
-    """Download a file from Google Drive to the specified local path."""
+def download_gdrive_file(file_id: str, filename: str, drive_service) -> bytes | None:
+    """Download a Google Drive file, by ID, into memory."""
     try:
-        parsed = urlparse(folder_url)
-        folder_id = parsed.path.strip('/').split('/')[-1]
-        if not folder_id or folder_id == 'folders':
-            logger.error(f"Invalid folder URL: {folder_url}")
-            return False
-
-        query = f"'{folder_id}' in parents and name = '{filename}' and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
-        if not files:
-            logger.error(f"File '{filename}' not found in folder ID '{folder_id}'")
-            return False
-
-        file_id = files[0]['id']
         request = drive_service.files().get_media(fileId=file_id)
-        with io.FileIO(output_path, 'wb') as f:
-            downloader = MediaIoBaseDownload(f, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                logger.info(f"Download progress for '{filename}': {int(status.progress() * 100)}%")
-        logger.info(f"File downloaded to: {output_path}")
-        return True
+        request.http = _thread_http()
+        buf = io.BytesIO()
+        downloader = MediaIoBaseDownload(buf, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+        deadline = time.monotonic() + DOWNLOAD_DEADLINE_SECONDS
+        done = False
+        while not done:
+            if time.monotonic() > deadline:
+                logger.error(f"Download of '{filename}' exceeded {DOWNLOAD_DEADLINE_SECONDS}s")
+                return None
+            status, done = downloader.next_chunk(num_retries=DRIVE_NUM_RETRIES)
+            logger.debug("Download progress for '%s': %d%%", filename, int(status.progress() * 100))
+        logger.info("Downloaded '%s' (%d bytes)", filename, buf.tell())
+        return buf.getvalue()
     except Exception as e:
         logger.error(f"Error downloading file '{filename}': {str(e)}")
-        return False
-
-@retry(stop_max_attempt_number=3, wait_fixed=2000)
+        return None
+
+def parse_post(post_content: str) -> tuple[str, str | None]:
+    """Split a post into its text and optional trailing [image] tag."""
+    match = POST_RE.match(post_content)
+    if not match:
+        return post_content, None
+    return match.group(1).strip(), match.group(2).strip()
+
+def _full_jitter_backoff(attempt_number, delay_since_first_attempt_ms):
+    """Exponential backoff with full jitter, capped at 4 seconds (in milliseconds)."""
+    return random.uniform(0, min(4000, 250 * 2 ** attempt_number))
+
+@retry(
+    stop_max_attempt_number=3,
+    wait_func=_full_jitter_backoff,
+    retry_on_exception=lambda e: isinstance(e, TimeoutError),
+)
 def click_with_retry(locator, timeout):
-    """Retry clicking a locator."""
+    """Retry clicking a locator on timeouts; other errors fail immediately."""
     locator.click(timeout=timeout)
 
-def perform_login(auth_file_path: str):
-    """Handles the first-time login and saves the auth state."""
+# Parsed auth state, shared by every context created in this process
+_auth_state = None
+
+def load_auth_state(auth_file_path: str) -> dict:
+    """Return the saved auth state as a dict, reading auth_file_path only once."""
+    global _auth_state
+    if _auth_state is None:
+        with open(auth_file_path, 'rb') as f:
+            _auth_state = json.load(f)
+    return _auth_state
+
+def save_auth_state(context, auth_file_path: str):
+    """Atomically write the context's auth state so a killed run never leaves a partial file."""
+    global _auth_state
+    tmp_path = auth_file_path + ".tmp"
+    _auth_state = context.storage_state(path=tmp_path)
+    os.replace(tmp_path, auth_file_path)
+
+def perform_login(context, auth_file_path: str):
+    """Handles the first-time login in the given browser context and saves the auth state."""
     X_USERNAME = os.getenv("X_USERNAME")
     X_PASSWORD = os.getenv("X_PASSWORD")
     if not X_USERNAME or not X_PASSWORD:
@@ -103,163 +211,224 @@ def perform_login(auth_file_path: str):
         raise LoginError("Login failed: X_USERNAME or X_PASSWORD not set in environment variables")
 
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
-
-            page.goto("https://typefully.com/", wait_until="domcontentloaded")
-            login_button = page.locator('button:has-text("Log in with X")').first
-            try:
-                login_button.wait_for(state="visible", timeout=15000)
-            except TimeoutError:
-                logger.error("Timeout waiting for login button to be visible")
-                raise LoginError("Login failed: Timeout waiting for 'Log in with X' button")
-
-            with page.expect_popup() as popup_info:
-                try:
-                    click_with_retry(login_button, timeout=15000)
-                except Exception as e:
-                    logger.error(f"Failed to click login button: {str(e)}")
-                    raise LoginError(f"Login failed: Could not click 'Log in with X' button: {str(e)}")
-
-            popup_page = popup_info.value
-            popup_page.wait_for_load_state()
-
-            try:
-                click_with_retry(popup_page.locator("#allow"), timeout=15000)
-            except Exception as e:
-                logger.error(f"Failed to click 'Allow' button: {str(e)}")
-                raise LoginError(f"Login failed: Could not click 'Allow' button: {str(e)}")
-
-            popup_page.get_by_label("Phone, email, or username").fill(X_USERNAME)
-            try:
-                click_with_retry(popup_page.get_by_role("button", name="Next"), timeout=15000)
-            except Exception as e:
-                logger.error(f"Failed to click 'Next' button after username: {str(e)}")
-                raise LoginError(f"Login failed: Could not click 'Next' after username: {str(e)}")
-
-            try:
-                popup_page.get_by_test_id("ocfEnterTextTextInput").fill(X_USERNAME, timeout=5000)
-                click_with_retry(popup_page.get_by_role("button", name="Next"), timeout=15000)
-            except TimeoutError:
-                logger.info("No additional username verification required")
-                pass
-
-            popup_page.locator('input[name="password"]').fill(X_PASSWORD)
-            try:
-                click_with_retry(popup_page.get_by_test_id("LoginForm_Login_Button"), timeout=15000)
-            except Exception as e:
-                logger.error(f"Failed to click login button after password: {str(e)}")
-                raise LoginError(f"Login failed: Could not click login button after password: {str(e)}")
-
-            try:
-                click_with_retry(popup_page.get_by_role("button", name="Authorize app"), timeout=15000)
-            except Exception as e:
-                logger.error(f"Failed to click 'Authorize app' button: {str(e)}")
-                raise LoginError(f"Login failed: Could not click 'Authorize app' button: {str(e)}")
+        page = context.new_page()
 
-            try:
-                popup_page.wait_for_event("close", timeout=60000)
-            except TimeoutError:
-                logger.error("Timeout waiting for popup to close")
-                raise LoginError("Login failed: Popup did not close within timeout")
+        page.goto("https://typefully.com/", wait_until="domcontentloaded")
+        login_button = page.locator('button:has-text("Log in with X")').first
+        try:
+            login_button.wait_for(state="visible", timeout=15000)
+        except TimeoutError:
+            logger.error("Timeout waiting for login button to be visible")
+            raise LoginError("Login failed: Timeout waiting for 'Log in with X' button")
 
-            page.wait_for_timeout(3000)
+        with page.expect_popup() as popup_info:
             try:
-                page.context.storage_state(path=auth_file_path)
-                logger.info(f"Saved auth state to {auth_file_path}")
+                click_with_retry(login_button, timeout=15000)
             except Exception as e:
-                logger.error(f"Failed to save auth state to {auth_file_path}: {str(e)}")
-                raise LoginError(f"Login failed: Could not save auth state to {auth_file_path}: {str(e)}")
-
-            browser.close()
+                logger.error(f"Failed to click login button: {str(e)}")
+                raise LoginError(f"Login failed: Could not click 'Log in with X' button: {str(e)}")
+
+        popup_page = popup_info.value
+        popup_page.wait_for_load_state()
+
+        try:
+            click_with_retry(popup_page.locator("#allow"), timeout=15000)
+        except Exception as e:
+            logger.error(f"Failed to click 'Allow' button: {str(e)}")
+            raise LoginError(f"Login failed: Could not click 'Allow' button: {str(e)}")
+
+        popup_page.get_by_label("Phone, email, or username").fill(X_USERNAME)
+        try:
+            click_with_retry(popup_page.get_by_role("button", name="Next"), timeout=15000)
+        except Exception as e:
+            logger.error(f"Failed to click 'Next' button after username: {str(e)}")
+            raise LoginError(f"Login failed: Could not click 'Next' after username: {str(e)}")
+
+        try:
+            popup_page.get_by_test_id("ocfEnterTextTextInput").fill(X_USERNAME, timeout=5000)
+            click_with_retry(popup_page.get_by_role("button", name="Next"), timeout=15000)
+        except TimeoutError:
+            logger.info("No additional username verification required")
+            pass
+
+        popup_page.locator('input[name="password"]').fill(X_PASSWORD)
+        try:
+            click_with_retry(popup_page.get_by_test_id("LoginForm_Login_Button"), timeout=15000)
+        except Exception as e:
+            logger.error(f"Failed to click login button after password: {str(e)}")
+            raise LoginError(f"Login failed: Could not click login button after password: {str(e)}")
+
+        try:
+            click_with_retry(popup_page.get_by_role("button", name="Authorize app"), timeout=15000)
+        except Exception as e:
+            logger.error(f"Failed to click 'Authorize app' button: {str(e)}")
+            raise LoginError(f"Login failed: Could not click 'Authorize app' button: {str(e)}")
+
+        try:
+            popup_page.wait_for_event("close", timeout=60000)
+        except TimeoutError:
+            logger.error("Timeout waiting for popup to close")
+            raise LoginError("Login failed: Popup did not close within timeout")
+
+        # Typefully keeps its session in localStorage; wait for it to be written
+        try:
+            page.wait_for_function("() => window.localStorage.getItem('writhread:auth') !== null", timeout=15000)
+        except TimeoutError:
+            logger.error("Timeout waiting for the Typefully session to be stored")
+            raise LoginError("Login failed: Typefully session was not stored after authorization")
+
+        try:
+            save_auth_state(context, auth_file_path)
+            logger.info(f"Saved auth state to {auth_file_path}")
+        except Exception as e:
+            logger.error(f"Failed to save auth state to {auth_file_path}: {str(e)}")
+            raise LoginError(f"Login failed: Could not save auth state to {auth_file_path}: {str(e)}")
+
+        page.close()
     except Exception as e:
         logger.error(f"Unexpected error during login: {str(e)}")
         raise LoginError(f"Login failed due to unexpected error: {str(e)}")
 
-def automate_typefully(posts, folder_url: str):
-    """Automate Typefully posting with images downloaded from Google Drive."""
+def open_authenticated_context(browser, auth_file_path: str):
+    """Create a browser context from the saved auth state, logging in first if there is none."""
+    if os.path.isfile(auth_file_path):
+        logger.info("Found auth.json, proceeding with Typefully automation.")
+        return browser.new_context(storage_state=load_auth_state(auth_file_path))
+
+    # Log in and post from the same context; auth.json is only written for future runs
+    logger.info("No auth.json found, performing login.")
+    context = browser.new_context()
+    perform_login(context, auth_file_path)
+    if not os.path.isfile(auth_file_path):
+        logger.error("Failed to create auth.json after login attempt.")
+        raise LoginError("Login failed: auth.json was not created after login attempt")
+    logger.info("Login successful, auth.json created. Proceeding with Typefully automation.")
+    return context
+
+def launch_browser(p):
+    """Launch headless Chromium with the features this automation does not need turned off."""
+    return p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
+
+def _host_in(hostname: str, domains) -> bool:
+    """Whether hostname is one of the domains or a subdomain of one."""
+    return any(hostname == domain or hostname.endswith("." + domain) for domain in domains)
+
+def _block_third_party_assets(route):
+    """Abort trackers and third-party fonts, images and media; let everything else through."""
+    request = route.request
+    hostname = urlparse(request.url).hostname or ""
+    if _host_in(hostname, BLOCKED_HOSTS):
+        route.abort()
+    elif request.resource_type in BLOCKED_RESOURCE_TYPES and not _host_in(hostname, ("typefully.com",)):
+        route.abort()
+    else:
+        route.continue_()
+
+def automate_typefully(context, posts, folder_url: str):
+    """Automate Typefully posting, in an authenticated context, with images from Google Drive."""
     try:
         drive_service = get_drive_service()
     except Exception as e:
         logger.error(f"Failed to initialize Google Drive service: {str(e)}")
-        sys.exit(1)
+        raise PostingError(f"Failed to initialize Google Drive service: {str(e)}")
 
-    # Check if all image files exist in Google Drive
-    for post_content in posts:
-        split_result = post_content.split('[')
-        if len(split_result) > 1:
-            image_tag = split_result[1].replace(']', '').strip()
-            if not check_gdrive_file_exists(folder_url, image_tag, drive_service):
-                logger.error(f"Aborting: Image '{image_tag}' not found in Google Drive.")
-                sys.exit(1)
+    # Unique image tags in order of first use; an image shared by several
+    # posts is looked up and downloaded only once
+    parsed_posts = [parse_post(post_content) for post_content in posts]
+    image_tags = list(dict.fromkeys(image_tag for _, image_tag in parsed_posts if image_tag))
+
+    # Create downloads directory (used for error screenshots)
+    downloads_dir = os.getenv("DOWNLOADS_DIR", "/app/data/downloads")
+    os.makedirs(downloads_dir, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        # Resolve all image files in Google Drive with a single lookup,
+        # in the background while Typefully loads
+        lookup = pool.submit(find_gdrive_files, folder_url, image_tags, drive_service)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(storage_state=os.getenv("AUTH_FILE_PATH", "/app/data/auth.json"))
         page = context.new_page()
+        page.route("**/*", _block_third_party_assets)
         page.goto('https://typefully.com', timeout=0)
-        page.wait_for_timeout(10000)
+        page.wait_for_load_state("domcontentloaded")
+        new_draft_button = page.get_by_role("button", name="New draft")
+        new_draft_button.wait_for(state="visible", timeout=15000)
+
+        # Every image must exist before a draft is created
+        file_ids = lookup.result()
+        if file_ids is None:
+            logger.error("Aborting: Could not look up images in Google Drive.")
+            raise PostingError("Could not look up images in Google Drive")
+        for image_tag in image_tags:
+            if image_tag not in file_ids:
+                logger.error(f"Aborting: Image '{image_tag}' not found in Google Drive.")
+                raise PostingError(f"Image '{image_tag}' not found in Google Drive")
 
-        # Create downloads directory
-        downloads_dir = os.getenv("DOWNLOADS_DIR", "/app/data/downloads")
-        os.makedirs(downloads_dir, exist_ok=True)
+        # Start all image downloads up front so they run while the browser works;
+        # submitting in order of first use gets the first post's image soonest
+        downloads = {
+            image_tag: pool.submit(download_gdrive_file, file_ids[image_tag], image_tag, drive_service)
+            for image_tag in image_tags
+        }
 
         # Start a new draft
-        click_with_retry(page.get_by_role("button", name="New draft"), timeout=15000)
+        click_with_retry(new_draft_button, timeout=15000)
         page.wait_for_selector('div[data-atom-index="0"]', timeout=15000)
-        page.wait_for_timeout(10000)
 
         # Loop through each post
-        for i, post_content in enumerate(posts):
+        for i, (text_to_type, image_tag) in enumerate(parsed_posts):
             tweet_number = f"#{i + 1}"
             tweet_container = page.locator(f'div[data-atom-index="{i}"]')
 
             # --- UPLOAD IMAGE FROM GOOGLE DRIVE ---
-            split_result = post_content.split('[')
-            if len(split_result) > 1:
-                image_tag = split_result[1].replace(']', '').strip()
-                image_path = os.path.join(downloads_dir, image_tag)
-                
-                # Download image from Google Drive
-                if not download_gdrive_file(folder_url, image_tag, image_path, drive_service):
+            if image_tag:
+                # Wait for the prefetched download of this image
+                image_bytes = downloads[image_tag].result()
+                if image_bytes is None:
                     logger.error(f"Failed to download image '{image_tag}' for {tweet_number}. Aborting.")
                     page.screenshot(path=f"{downloads_dir}/error_download_{tweet_number}.png")
-                    sys.exit(1)
+                    raise PostingError(f"Failed to download image '{image_tag}' for {tweet_number}")
 
                 try:
                     with page.expect_file_chooser(timeout=30000) as fc_info:
                         tweet_container.hover()
-                        media_button_icon = tweet_container.locator('button:has(svg > rect[x="3"])')
+                        media_button_icon = tweet_container.locator(MEDIA_BUTTON_SELECTOR)
                         media_button_icon.wait_for(state="visible", timeout=5000)
                         click_with_retry(media_button_icon, timeout=5000)
-                        page.wait_for_timeout(1000)
                         upload_menu_item = page.get_by_role("menuitem", name="Upload images or video")
+                        upload_menu_item.wait_for(state="visible", timeout=5000)
                         click_with_retry(upload_menu_item, timeout=15000)
                     
                     file_chooser = fc_info.value
-                    file_chooser.set_files(image_path)
+                    file_chooser.set_files({
+                        "name": image_tag,
+                        "mimeType": mimetypes.guess_type(image_tag)[0] or "application/octet-stream",
+                        "buffer": image_bytes,
+                    })
                     
                     uploaded_image_preview = tweet_container.locator('img').nth(1)
                     uploaded_image_preview.wait_for(state="visible", timeout=20000)
 
-                    # Clean up downloaded image
-                    os.remove(image_path)
-                    logger.info(f"Deleted temporary file: {image_path}")
-
                 except Exception as e:
                     logger.error(f"Error during image upload for {tweet_number}: {str(e)}")
                     page.screenshot(path=f"{downloads_dir}/error_media_{tweet_number}.png")
                     raise
 
             # --- TEXT INPUT ---
-            text_to_type = split_result[0].strip() if len(split_result) > 1 else post_content
             try:
-                text_area_container = tweet_container.locator('div[data-node-view-content]').first
+                text_area_container = tweet_container.locator(TEXT_AREA_SELECTOR).first
                 text_area_container.click()
-                page.wait_for_timeout(500)
-                page.keyboard.type(text_to_type, delay=50)
+                page.wait_for_function(
+                    # Focus must be inside the tweet's own editor, not just anywhere on <body>
+                    "el => (el.closest('[contenteditable=\"true\"]') || el).contains(document.activeElement)",
+                    arg=text_area_container.element_handle(),
+                    timeout=5000,
+                )
+                page.keyboard.insert_text(text_to_type)
+                page.wait_for_function(
+                    '([el, text]) => el.textContent.replace(/\\s+/g, "") === text.replace(/\\s+/g, "")',
+                    arg=[text_area_container.element_handle(), text_to_type],
+                    timeout=5000,
+                )
             except Exception as e:
                 logger.error(f"Error typing text for {tweet_number}: {str(e)}")
                 page.screenshot(path=f"{downloads_dir}/error_typing_{tweet_number}.png")
@@ -267,19 +436,18 @@ def automate_typefully(posts, folder_url: str):
 
             # --- ADD A NEW TWEET ---
             if i < len(posts) - 1:
-                add_tweet_button = tweet_container.locator('button:has(svg > path[d="M4 5H20"])')
+                add_tweet_button = tweet_container.locator(ADD_TWEET_BUTTON_SELECTOR)
                 click_with_retry(add_tweet_button, timeout=15000)
                 page.locator(f'div[data-atom-index="{i + 1}"]').wait_for(state="visible", timeout=10000)
-                page.wait_for_timeout(1000)
 
         # --- Publishing ---
         click_with_retry(page.get_by_role("button", name="Publish", exact=True), timeout=15000)
-        page.wait_for_timeout(5000)
-        click_with_retry(page.get_by_role("button", name="Publish now"), timeout=15000)
-        page.wait_for_timeout(10000)
+        publish_now_button = page.get_by_role("button", name="Publish now")
+        publish_now_button.wait_for(state="visible", timeout=15000)
+        click_with_retry(publish_now_button, timeout=15000)
+        publish_now_button.wait_for(state="detached", timeout=30000)
 
-        context.close()
-        browser.close()
+        page.close()
 
 if __name__ == "__main__":
     AUTH_FILE = os.getenv("AUTH_FILE_PATH", "/app/data/auth.json")
@@ -293,18 +461,12 @@ if __name__ == "__main__":
         if not folder_url:
             logger.error("GOOGLE_DRIVE_FOLDER_URL not set in .env file.")
             raise LoginError("Failed to initialize: GOOGLE_DRIVE_FOLDER_URL not set in environment variables")
-        if os.path.isfile(AUTH_FILE):
-            logger.info("Found auth.json, proceeding with Typefully automation.")
-            automate_typefully(posts, folder_url)
-        else:
-            logger.info("No auth.json found, performing login.")
-            perform_login(AUTH_FILE)
-            if os.path.isfile(AUTH_FILE):
-                logger.info("Login successful, auth.json created. Proceeding with Typefully automation.")
-                automate_typefully(posts, folder_url)
-            else:
-                logger.error("Failed to create auth.json after login attempt.")
-                raise LoginError("Login failed: auth.json was not created after login attempt")
+        with sync_playwright() as p:
+            browser = launch_browser(p)
+            context = open_authenticated_context(browser, AUTH_FILE)
+            automate_typefully(context, posts, folder_url)
+            context.close()
+            browser.close()
     except LoginError as e:
         logger.error(f"Login error: {str(e)}")
         sys.exit(1)
@@ -1,3 +1,4 @@
 #!/bin/bash
 mkdir -p /app/data/downloads
-exec python docker_run.py
\ No newline at end of file
+# Runs docker_run.py by default; pass another script (e.g. worker.py) to run that instead
+exec python "${@:-docker_run.py}"
\ No newline at end of file
@@ -0,0 +1,146 @@
+"""Long-running Typefully worker.
+
+Keeps one browser and one authenticated context open and publishes a thread
+for every job POSTed to /jobs as JSON: {"posts": [...], "folder_url": "..."}.
+folder_url falls back to GOOGLE_DRIVE_FOLDER_URL. Jobs run one at a time on
+the main thread, since the sync Playwright API is not thread-safe.
+
+Jobs must carry the WORKER_TOKEN secret in an X-Worker-Token header; without
+a token the worker only listens on a loopback address.
+"""
+import os
+import sys
+import hmac
+import json
+import signal
+import logging
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from playwright.sync_api import sync_playwright
+from docker_run import (
+    automate_typefully,
+    launch_browser,
+    open_authenticated_context,
+    save_auth_state,
+)
+
+logger = logging.getLogger(__name__)
+
+AUTH_FILE = os.getenv("AUTH_FILE_PATH", "/app/data/auth.json")
+WORKER_HOST = os.getenv("WORKER_HOST", "127.0.0.1")
+WORKER_PORT = int(os.getenv("WORKER_PORT", "8080"))
+# Shared secret that every job has to send; anyone holding it can publish
+WORKER_TOKEN = os.getenv("WORKER_TOKEN")
+
+# Save the live session to auth.json every this many jobs, so a restarted
+# worker picks up fresh tokens instead of logging in again (at least every job)
+AUTH_REFRESH_EVERY = max(1, int(os.getenv("AUTH_REFRESH_EVERY", "10")))
+
+# A job is a short JSON document; anything bigger is refused unread
+MAX_JOB_BYTES = 1024 * 1024
+
+class JobHandler(BaseHTTPRequestHandler):
+    """Runs each POST /jobs request against the server's shared browser context."""
+
+    def do_POST(self):
+        if self.path != "/jobs":
+            self._reply(404, {"status": "error", "error": "Not found"})
+            return
+        if not self._authorized():
+            self._reply(401, {"status": "error", "error": "Missing or invalid X-Worker-Token"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            if not 0 < length <= MAX_JOB_BYTES:
+                raise ValueError(f"Content-Length must be between 1 and {MAX_JOB_BYTES}")
+            job = json.loads(self.rfile.read(length))
+            posts = job["posts"]
+            folder_url = job.get("folder_url") or os.getenv("GOOGLE_DRIVE_FOLDER_URL")
+            if not isinstance(posts, list) or not all(isinstance(post, str) for post in posts):
+                raise ValueError("'posts' must be a list of strings")
+            if folder_url is not None and not isinstance(folder_url, str):
+                raise ValueError("'folder_url' must be a string")
+            if not posts or not folder_url:
+                raise ValueError("Job needs non-empty 'posts' and a 'folder_url'")
+        except (ValueError, KeyError, TypeError) as e:
+            self._reply(400, {"status": "error", "error": f"Invalid job: {str(e)}"})
+            return
+
+        context = self.server.context
+        try:
+            automate_typefully(context, posts, folder_url)
+        except Exception as e:
+            logger.error(f"Job failed: {str(e)}")
+            # Drop pages left behind by the failed job so the next one starts clean
+            for page in context.pages:
+                page.close()
+            self._reply(500, {"status": "failed", "error": str(e)})
+            return
+
+        self.server.jobs_done += 1
+        if self.server.jobs_done % AUTH_REFRESH_EVERY == 0:
+            save_auth_state(context, AUTH_FILE)
+            logger.info(f"Refreshed auth state in {AUTH_FILE}")
+        self._reply(200, {"status": "published", "posts": len(posts)})
+
+    def _authorized(self) -> bool:
+        """Check the job's X-Worker-Token against WORKER_TOKEN (always true on loopback without one)."""
+        if not WORKER_TOKEN:
+            return True
+        token = self.headers.get("X-Worker-Token", "")
+        return hmac.compare_digest(token.encode(), WORKER_TOKEN.encode())
+
+    def _reply(self, code: int, body: dict):
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.info("%s - %s", self.address_string(), format % args)
+
+def _is_loopback(host: str) -> bool:
+    """Whether the worker would only be reachable from this machine."""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def main():
+    if not WORKER_TOKEN and not _is_loopback(WORKER_HOST):
+        logger.error(f"Refusing to listen on {WORKER_HOST} without a WORKER_TOKEN.")
+        sys.exit(1)
+
+    with sync_playwright() as p:
+        browser = launch_browser(p)
+        context = open_authenticated_context(browser, AUTH_FILE)
+
+        server = HTTPServer((WORKER_HOST, WORKER_PORT), JobHandler)
+        server.context = context
+        server.jobs_done = 0
+        # docker stop sends SIGTERM: let the current job finish, then shut down
+        # cleanly (shutdown() blocks until serve_forever returns, hence the thread)
+        signal.signal(
+            signal.SIGTERM,
+            lambda signum, frame: threading.Thread(target=server.shutdown, daemon=True).start(),
+        )
+        logger.info(f"Worker listening on {WORKER_HOST}:{WORKER_PORT}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            save_auth_state(context, AUTH_FILE)
+            context.close()
+            browser.close()
+            logger.info("Worker stopped.")
+
+if __name__ == "__main__":
+    main()
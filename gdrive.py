@@ -1,21 +1,34 @@
 import os
 import io
 import logging
+import re
+from functools import lru_cache
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaIoBaseDownload
 from google.oauth2.service_account import Credentials
-from urllib.parse import urlparse
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# Load environment variables
+load_dotenv()
+
+# Configure logging (set LOG_LEVEL=DEBUG for per-chunk download progress)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Suppress file_cache warning
 logging.getLogger('googleapiclient.discovery_cache').setLevel(logging.ERROR)
 
-# Load environment variables
-load_dotenv()
+# Large enough that typical images download in a single request
+DOWNLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+
+# Drive folder URLs look like https://drive.google.com/drive/folders/<folder_id>
+FOLDER_ID_RE = re.compile(r'/folders/([A-Za-z0-9_-]{10,})')
+
+@lru_cache(maxsize=None)
+def _parse_folder_id(folder_url: str) -> str | None:
+    """Extract the folder ID from a Google Drive folder URL, or None if malformed."""
+    match = FOLDER_ID_RE.search(folder_url)
+    return match.group(1) if match else None
 
 def get_drive_service():
     """Create Google Drive service with service account credentials from .env."""
@@ -30,20 +43,19 @@ def get_drive_service():
 
         scopes = ['https://www.googleapis.com/auth/drive']
         credentials = Credentials.from_service_account_file(credentials_path, scopes=scopes)
-        return build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        return build('drive', 'v3', credentials=credentials, cache_discovery=False, static_discovery=True)
     except Exception as e:
         logger.error(f"Failed to authenticate with service account: {str(e)}")
         raise
 
 def download_and_read_gdrive_file(folder_url: str, filename: str) -> bytes | None:
-    """Download a file from Google Drive, read its content, and clean up."""
+    """Download a file from Google Drive and return its content."""
     try:
         drive_service = get_drive_service()
 
         # Extract folder ID from URL
-        parsed = urlparse(folder_url)
-        folder_id = parsed.path.strip('/').split('/')[-1]
-        if not folder_id or folder_id == 'folders':
+        folder_id = _parse_folder_id(folder_url)
+        if not folder_id:
             logger.error(f"Invalid folder URL: {folder_url}. Expected format: https://drive.google.com/drive/folders/<folder_id>")
             return None
 
@@ -57,30 +69,18 @@ def download_and_read_gdrive_file(folder_url: str, filename: str) -> bytes | Non
             return None
 
         file_id = files[0]['id']
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        downloads_dir = os.path.join(script_dir, 'temp')
-        os.makedirs(downloads_dir, exist_ok=True)
-        output_path = os.path.join(downloads_dir, filename)
 
-        # Download file
+        # Download file straight into memory
         request = drive_service.files().get_media(fileId=file_id)
-        with io.FileIO(output_path, 'wb') as f:
-            downloader = MediaIoBaseDownload(f, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                logger.info(f"Download progress: {int(status.progress() * 100)}%")
-
-        # Read file content
-        logger.info(f"File downloaded to: {output_path}")
-        with open(output_path, 'rb') as f:
-            content = f.read()
-            logger.info(f"File content size: {len(content)} bytes")
-            
-
-        # Clean up
-        os.remove(output_path)
-        logger.info(f"Deleted temporary file: {output_path}")
+        buf = io.BytesIO()
+        downloader = MediaIoBaseDownload(buf, request, chunksize=DOWNLOAD_CHUNK_SIZE)
+        done = False
+        while not done:
+            status, done = downloader.next_chunk()
+            logger.debug("Download progress: %d%%", int(status.progress() * 100))
+
+        content = buf.getvalue()
+        logger.info("File content size: %d bytes", len(content))
         return content
 
     except Exception as e:
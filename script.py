@@ -1,8 +1,19 @@
 import os
+import re
 import sys
 from playwright.sync_api import sync_playwright, TimeoutError
 from dotenv import load_dotenv
 
+# "Post text [image.jpg]" -> ("Post text", "image.jpg")
+POST_RE = re.compile(r'^(.*?)\[([^\]]+)\]\s*$', re.S)
+
+def parse_post(post_content: str) -> tuple[str, str | None]:
+    """Split a post into its text and optional trailing [image] tag."""
+    match = POST_RE.match(post_content)
+    if not match:
+        return post_content, None
+    return match.group(1).strip(), match.group(2).strip()
+
 def perform_login(auth_file_path: str):
     """
     Handles the first-time login and saves the full, reusable auth state.
@@ -54,8 +65,8 @@ def perform_login(auth_file_path: str):
         # 10. Wait for the popup to close, signaling completion of login
         popup_page.wait_for_event("close", timeout=60000)
         
-        # 11 Authorization complete. Waiting 3 seconds for the main page to process login...
-        page.wait_for_timeout(3000)
+        # 11. Authorization complete. Wait for the main page to store the session in localStorage
+        page.wait_for_function("() => window.localStorage.getItem('writhread:auth') !== null", timeout=15000)
         
         # 12. Save the authenticated browser context for future sessions
         page.context.storage_state(path=auth_file_path)
@@ -67,23 +78,22 @@ def automate_typefully(posts):
         context = browser.new_context(storage_state='auth.json')
         page = context.new_page()
         page.goto('https://typefully.com', timeout=0)
+        page.wait_for_load_state("domcontentloaded")
 
-        page.wait_for_timeout(10000)
-
-        # 1. Start a new draft and wait for it to settle
-        page.get_by_role("button", name="New draft").click()
+        # 1. Start a new draft and wait for the first tweet editor to appear
+        new_draft_button = page.get_by_role("button", name="New draft")
+        new_draft_button.wait_for(state="visible", timeout=15000)
+        new_draft_button.click()
         page.wait_for_selector('div[data-atom-index="0"]', timeout=15000)
-        page.wait_for_timeout(10000)
 
         # 2. Loop through each post
         for i, post_content in enumerate(posts):
+            text_to_type, image_tag = parse_post(post_content)
             tweet_number = f"#{i + 1}"
             tweet_container = page.locator(f'div[data-atom-index="{i}"]')
 
             # --- UPLOAD IMAGE FIRST ---
-            split_result = post_content.split('[')
-            if len(split_result) > 1:
-                image_tag = split_result[1].replace(']', '').strip()
+            if image_tag:
                 image_path = os.path.join(os.getcwd(), image_tag)
                 try:
                     with page.expect_file_chooser(timeout=30000) as fc_info:
@@ -91,8 +101,8 @@ def automate_typefully(posts):
                         media_button_icon = tweet_container.locator('button:has(svg > rect[x="3"])')
                         media_button_icon.wait_for(state="visible", timeout=5000)
                         media_button_icon.click()
-                        page.wait_for_timeout(1000)
                         upload_menu_item = page.get_by_role("menuitem", name="Upload images or video")
+                        upload_menu_item.wait_for(state="visible", timeout=5000)
                         upload_menu_item.click(force=True)
                     
                     file_chooser = fc_info.value
@@ -107,20 +117,26 @@ def automate_typefully(posts):
                     raise
             
             # --- TEXT INPUT ---
-            if len(split_result) > 1:
-                text_to_type = post_content.split('[')[0].strip()
-            else:
-                text_to_type = post_content
             try:
                 # 1. Click the general text area to establish focus.
                 text_area_container = tweet_container.locator('div[data-node-view-content]').first
                 text_area_container.click()
                 
-                # 2. Add a pause to ensure the cursor is blinking and ready.
-                page.wait_for_timeout(500)
-
-                # 3. Use the main page keyboard to type into the focused element.
-                page.keyboard.type(text_to_type, delay=50)
+                # 2. Wait until the editor actually holds the focus.
+                page.wait_for_function(
+                    # Focus must be inside the tweet's own editor, not just anywhere on <body>
+                    "el => (el.closest('[contenteditable=\"true\"]') || el).contains(document.activeElement)",
+                    arg=text_area_container.element_handle(),
+                    timeout=5000,
+                )
+
+                # 3. Insert the whole text in one go and wait for the editor to hold it.
+                page.keyboard.insert_text(text_to_type)
+                page.wait_for_function(
+                    '([el, text]) => el.textContent.replace(/\\s+/g, "") === text.replace(/\\s+/g, "")',
+                    arg=[text_area_container.element_handle(), text_to_type],
+                    timeout=5000,
+                )
 
             except Exception as e:
                 print(f"Error typing text for {tweet_number}: {e}")
@@ -132,15 +148,16 @@ def automate_typefully(posts):
                 add_tweet_button = tweet_container.locator('button:has(svg > path[d="M4 5H20"])')
                 add_tweet_button.click()
                 page.locator(f'div[data-atom-index="{i + 1}"]').wait_for(state="visible", timeout=10000)
-                page.wait_for_timeout(1000)
 
         # --- Publishing ---
         
         page.get_by_role("button", name="Publish", exact=True).click()
-        page.wait_for_timeout(5000)
-        page.get_by_role("button", name="Publish now").click()
-        
-        page.wait_for_timeout(10000)
+        publish_now_button = page.get_by_role("button", name="Publish now")
+        publish_now_button.wait_for(state="visible", timeout=15000)
+        publish_now_button.click()
+
+        # The confirmation dialog goes away once Typefully has accepted the thread
+        publish_now_button.wait_for(state="detached", timeout=30000)
 
         context.close()
         browser.close()
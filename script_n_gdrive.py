@@ -1,136 +1,249 @@
 import os
-import io
 import sys
 import logging
-from playwright.sync_api import sync_playwright, TimeoutError
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
-from google.oauth2.service_account import Credentials
+import mimetypes
+import re
+import threading
 from urllib.parse import urlparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# The Google client libraries and Playwright are slow to import, so they are
+# imported in the functions that use them
+
+# Load environment variables
+load_dotenv()
+
+# Configure logging (set LOG_LEVEL=DEBUG to see blocked requests)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 # Suppress file_cache warning
 logging.getLogger('googleapiclient.discovery_cache').setLevel(logging.ERROR)
 
-# Load environment variables
-load_dotenv()
+# Chromium profile holding the Typefully session between runs
+PROFILE_DIR = "./.pw-profile"
+
+# Chromium flags for an unattended run; nothing here needs a GPU or extensions
+CHROMIUM_ARGS = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-timer-throttling",
+]
+VIEWPORT = {'width': 1280, 'height': 800}
+
+# Analytics and support widgets are never needed to drive the editor, nor are
+# third-party fonts, images and media. Hosts match themselves and their subdomains
+BLOCKED_HOSTS = (
+    "intercom.io", "intercomcdn.com", "segment.io", "segment.com",
+    "googletagmanager.com", "google-analytics.com", "sentry.io",
+)
+BLOCKED_RESOURCE_TYPES = {"font", "media", "image"}
+
+# "Post text [image.jpg]" -> ("Post text", "image.jpg")
+POST_RE = re.compile(r'^(.*?)\[([^\]]+)\]\s*$', re.S)
+
+# Drive folder URLs look like https://drive.google.com/drive/folders/<folder_id>
+FOLDER_ID_RE = re.compile(r'/folders/([A-Za-z0-9_-]{10,})')
+
+@lru_cache(maxsize=None)
+def _parse_folder_id(folder_url: str) -> str | None:
+    """Extract the folder ID from a Google Drive folder URL, or None if malformed."""
+    match = FOLDER_ID_RE.search(folder_url)
+    return match.group(1) if match else None
+
+def parse_post(post_content: str) -> tuple[str, str | None]:
+    """Split a post into its text and optional trailing [image] tag."""
+    match = POST_RE.match(post_content)
+    if not match:
+        return post_content, None
+    return match.group(1).strip(), match.group(2).strip()
+
+@lru_cache(maxsize=1)
+def _drive_credentials():
+    """Load the service account credentials from .env once; every thread shares them."""
+    from google.oauth2.service_account import Credentials
+
+    credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
+    if not credentials_path:
+        logger.error("GOOGLE_CREDENTIALS_PATH not set in .env file.")
+        raise ValueError("Missing GOOGLE_CREDENTIALS_PATH")
+    if not os.path.exists(credentials_path):
+        logger.error(f"Credentials file not found: {credentials_path}")
+        raise FileNotFoundError(f"Credentials file not found: {credentials_path}")
+
+    scopes = ['https://www.googleapis.com/auth/drive']
+    return Credentials.from_service_account_file(credentials_path, scopes=scopes)
 
 def get_drive_service():
     """Create Google Drive service with service account credentials from .env."""
+    from googleapiclient.discovery import build
+
     try:
-        credentials_path = os.getenv("GOOGLE_CREDENTIALS_PATH")
-        if not credentials_path:
-            logger.error("GOOGLE_CREDENTIALS_PATH not set in .env file.")
-            raise ValueError("Missing GOOGLE_CREDENTIALS_PATH")
-        if not os.path.exists(credentials_path):
-            logger.error(f"Credentials file not found: {credentials_path}")
-            raise FileNotFoundError(f"Credentials file not found: {credentials_path}")
-
-        scopes = ['https://www.googleapis.com/auth/drive']
-        credentials = Credentials.from_service_account_file(credentials_path, scopes=scopes)
-        return build('drive', 'v3', credentials=credentials, cache_discovery=False)
+        return build('drive', 'v3', credentials=_drive_credentials(), cache_discovery=False, static_discovery=True)
     except Exception as e:
         logger.error(f"Failed to authenticate with service account: {str(e)}")
         raise
 
-def check_gdrive_file_exists(folder_url: str, filename: str, drive_service) -> bool:
-    """Check if a file exists in the specified Google Drive folder."""
+# Only the name and ID of each file are needed, plus the token for the next page
+FOLDER_LIST_FIELDS = "nextPageToken, files(id, name)"
+
+# One keep-alive connection per thread, reused across Drive requests
+_thread_local = threading.local()
+
+def _thread_http():
+    """Return this thread's authorized HTTP client (httplib2 is not thread-safe)."""
+    http = getattr(_thread_local, 'http', None)
+    if http is None:
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+
+        http = AuthorizedHttp(_drive_credentials(), http=httplib2.Http())
+        _thread_local.http = http
+    return http
+
+def _prewarm_drive():
+    """Load the credentials and fetch an access token before the first Drive request needs one."""
+    try:
+        import httplib2
+        from google_auth_httplib2 import Request
+
+        _drive_credentials().refresh(Request(httplib2.Http()))
+    except Exception as e:
+        # Not fatal: the first Drive request refreshes the token itself
+        logger.debug(f"Could not pre-warm Google Drive access: {str(e)}")
+
+def list_folder(folder_id: str, drive_service) -> dict[str, str] | None:
+    """Map the name of every file in a Google Drive folder to its file ID.
+
+    The whole folder is listed once, so any number of images resolve with
+    dict lookups; None means the listing failed.
+    """
     try:
-        parsed = urlparse(folder_url)
-        folder_id = parsed.path.strip('/').split('/')[-1]
-        if not folder_id or folder_id == 'folders':
-            logger.error(f"Invalid folder URL: {folder_url}. Expected format: https://drive.google.com/drive/folders/<folder_id>")
-            return False
-
-        query = f"'{folder_id}' in parents and name = '{filename}' and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
-        if not files:
-            logger.error(f"File '{filename}' not found in folder ID '{folder_id}'.")
-            return False
-        return True
+        file_ids = {}
+        request = drive_service.files().list(
+            q=f"'{folder_id}' in parents and trashed = false",
+            fields=FOLDER_LIST_FIELDS,
+            pageSize=1000,
+        )
+        while request is not None:
+            response = request.execute(http=_thread_http())
+            for f in response.get('files', []):
+                file_ids[f['name']] = f['id']
+            request = drive_service.files().list_next(request, response)
+        return file_ids
     except Exception as e:
-        logger.error(f"Error checking file '{filename}' in Google Drive: {str(e)}")
-        return False
+        logger.error(f"Error listing folder '{folder_id}' in Google Drive: {str(e)}")
+        return None
 
-def download_gdrive_file(folder_url: str, filename: str, output_path: str, drive_service) -> bool:
-    """Download a file from Google Drive to the specified local path."""
+def download_gdrive_file(file_id: str, filename: str, drive_service) -> bytes | None:
+    """Download a Google Drive file, by the ID from list_folder, into memory and return its content."""
     try:
-        parsed = urlparse(folder_url)
-        folder_id = parsed.path.strip('/').split('/')[-1]
-        if not folder_id or folder_id == 'folders':
-            logger.error(f"Invalid folder URL: {folder_url}")
-            return False
-
-        query = f"'{folder_id}' in parents and name = '{filename}' and trashed = false"
-        results = drive_service.files().list(q=query, fields="files(id, name)").execute()
-        files = results.get('files', [])
-        if not files:
-            logger.error(f"File '{filename}' not found in folder ID '{folder_id}'.")
-            return False
-
-        file_id = files[0]['id']
+        # A plain alt=media GET returns the whole body in one response
         request = drive_service.files().get_media(fileId=file_id)
-        with io.FileIO(output_path, 'wb') as f:
-            downloader = MediaIoBaseDownload(f, request)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                logger.info(f"Download progress for '{filename}': {int(status.progress() * 100)}%")
-        logger.info(f"File downloaded to: {output_path}")
-        return True
+        request.http = _thread_http()
+        content = request.execute()
+        logger.info(f"File downloaded: '{filename}' ({len(content)} bytes)")
+        return content
     except Exception as e:
         logger.error(f"Error downloading file '{filename}': {str(e)}")
-        return False
+        return None
 
-def perform_login(auth_file_path: str):
+def perform_login(context):
     """
-    Handles the first-time login and saves the full, reusable auth state.
+    Handles the login in a new page; the session is kept in the context's on-disk profile.
+    Returns the page, already logged in on Typefully, for the caller to keep working in.
     """
+    from playwright.sync_api import TimeoutError
+
     X_USERNAME = os.getenv("X_USERNAME")
     X_PASSWORD = os.getenv("X_PASSWORD")
     if not X_USERNAME or not X_PASSWORD:
         sys.exit("Error: Could not find X_USERNAME or X_PASSWORD in your .env file.")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
+    page = context.new_page()
 
-        page.goto("https://typefully.com/", wait_until="domcontentloaded")
-        login_button = page.locator('button:has-text("Log in with X")').first
-        login_button.wait_for(state="visible", timeout=15000)
-        
-        with page.expect_popup() as popup_info:
-            login_button.click()
+    page.goto("https://typefully.com/", wait_until="domcontentloaded")
+    login_button = page.locator('button:has-text("Log in with X")').first
+    login_button.wait_for(state="visible", timeout=15000)
+    
+    with page.expect_popup() as popup_info:
+        login_button.click()
 
-        popup_page = popup_info.value
-        popup_page.wait_for_load_state()
+    popup_page = popup_info.value
+    popup_page.wait_for_load_state()
 
-        popup_page.locator("#allow").click(timeout=15000)
-        popup_page.get_by_label("Phone, email, or username").fill(X_USERNAME)
+    popup_page.locator("#allow").click(timeout=15000)
+    popup_page.get_by_label("Phone, email, or username").fill(X_USERNAME)
+    popup_page.get_by_role("button", name="Next").click()
+    try:
+        popup_page.get_by_test_id("ocfEnterTextTextInput").fill(X_USERNAME, timeout=5000)
         popup_page.get_by_role("button", name="Next").click()
-        try:
-            popup_page.get_by_test_id("ocfEnterTextTextInput").fill(X_USERNAME, timeout=5000)
-            popup_page.get_by_role("button", name="Next").click()
-        except TimeoutError:
-            pass
-
-        popup_page.locator('input[name="password"]').fill(X_PASSWORD)
-        popup_page.get_by_test_id("LoginForm_Login_Button").click()
-        popup_page.get_by_role("button", name="Authorize app").click(timeout=15000)
-        
-        popup_page.wait_for_event("close", timeout=60000)
-        page.wait_for_timeout(3000)
-        page.context.storage_state(path=auth_file_path)
-        browser.close()
-
-def automate_typefully(posts, folder_url: str):
-    """Automate Typefully posting with images downloaded from Google Drive."""
+    except TimeoutError:
+        pass
+
+    popup_page.locator('input[name="password"]').fill(X_PASSWORD)
+    popup_page.get_by_test_id("LoginForm_Login_Button").click()
+    popup_page.get_by_role("button", name="Authorize app").click(timeout=15000)
+    
+    popup_page.wait_for_event("close", timeout=60000)
+    page.wait_for_function("() => window.localStorage.getItem('writhread:auth') !== null", timeout=15000)
+    return page
+
+def _host_in(hostname: str, domains) -> bool:
+    """Whether hostname is one of the domains or a subdomain of one."""
+    return any(hostname == domain or hostname.endswith("." + domain) for domain in domains)
+
+def _block_non_essential_requests(route):
+    """Abort trackers and third-party fonts, images and media; let everything else through."""
+    request = route.request
+    hostname = urlparse(request.url).hostname or ""
+    if _host_in(hostname, BLOCKED_HOSTS) or (
+        request.resource_type in BLOCKED_RESOURCE_TYPES and not _host_in(hostname, ("typefully.com",))
+    ):
+        logger.debug("Blocked %s request to %s", request.resource_type, request.url)
+        route.abort()
+    else:
+        route.continue_()
+
+def launch_context(p, headless: bool):
+    """Launch Chromium on the persistent profile, so the session survives between runs."""
+    return p.chromium.launch_persistent_context(
+        PROFILE_DIR, headless=headless, args=CHROMIUM_ARGS, viewport=VIEWPORT
+    )
+
+def _load_typefully(context):
+    """Load Typefully in a new page of the context."""
+    page = context.new_page()
+    page.route("**/*", _block_non_essential_requests)
+    page.goto('https://typefully.com')
+    page.wait_for_load_state("domcontentloaded")
+    return page
+
+def open_typefully(context):
+    """Open Typefully in a new page, logging in again if the profile's session has expired."""
+    page = _load_typefully(context)
+
+    # A stale session lands on the login screen instead of the editor
+    new_draft_button = page.get_by_role("button", name="New draft")
+    login_button = page.locator('button:has-text("Log in with X")')
+    new_draft_button.or_(login_button).first.wait_for(state="visible", timeout=15000)
+    if new_draft_button.is_visible():
+        return page
+
+    logger.info("Saved session has expired, logging in again to refresh the profile.")
+    page.close()
+    return perform_login(context)
+
+def automate_typefully(context, posts, folder_url: str, page=None):
+    """Automate Typefully posting with images downloaded from Google Drive.
+
+    Pass the page a fresh login left on Typefully to post from it directly;
+    otherwise Typefully is opened in a new page of the context.
+    """
     # Initialize Google Drive service
     try:
         drive_service = get_drive_service()
@@ -138,48 +251,62 @@ def automate_typefully(posts, folder_url: str):
         logger.error(f"Failed to initialize Google Drive service: {str(e)}")
         sys.exit(1)
 
-    # Check if all image files exist in Google Drive
-    for post_content in posts:
-        split_result = post_content.split('[')
-        if len(split_result) > 1:
-            image_tag = split_result[1].replace(']', '').strip()
-            if not check_gdrive_file_exists(folder_url, image_tag, drive_service):
-                logger.error(f"Aborting: Image '{image_tag}' not found in Google Drive.")
-                sys.exit(1)
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context(storage_state='auth.json')
-        page = context.new_page()
-        page.goto('https://typefully.com')
-        page.wait_for_timeout(10000)
-
-        # Create downloads directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        downloads_dir = os.path.join(script_dir, 'downloads')
-        os.makedirs(downloads_dir, exist_ok=True)
+    # Unique image tags, in order of first use
+    parsed_posts = [parse_post(post_content) for post_content in posts]
+    image_tags = list(dict.fromkeys(image_tag for _, image_tag in parsed_posts if image_tag))
+
+    folder_id = _parse_folder_id(folder_url)
+    if not folder_id:
+        logger.error(f"Invalid folder URL: {folder_url}. Expected format: https://drive.google.com/drive/folders/<folder_id>")
+        sys.exit(1)
+
+    # Resolve all image files in Google Drive with one listing of the folder
+    file_ids = list_folder(folder_id, drive_service) if image_tags else {}
+    if file_ids is None:
+        logger.error("Aborting: Could not look up images in Google Drive.")
+        sys.exit(1)
+    for image_tag in image_tags:
+        if image_tag not in file_ids:
+            logger.error(f"Aborting: Image '{image_tag}' not found in Google Drive.")
+            sys.exit(1)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        # Download every image in the background while the browser works
+        downloads = {
+            image_tag: pool.submit(download_gdrive_file, file_ids[image_tag], image_tag, drive_service)
+            for image_tag in image_tags
+        }
+        # Upload payloads of finished downloads, reused by every post with the same tag
+        image_cache: dict[str, dict] = {}
+
+        if page is None:
+            page = open_typefully(context)
 
         # Start a new draft
-        page.get_by_role("button", name="New draft").click()
+        new_draft_button = page.get_by_role("button", name="New draft")
+        new_draft_button.wait_for(state="visible", timeout=15000)
+        new_draft_button.click()
         page.wait_for_selector('div[data-atom-index="0"]', timeout=15000)
-        page.wait_for_timeout(10000)
 
         # Loop through each post
-        for i, post_content in enumerate(posts):
+        for i, (text_to_type, image_tag) in enumerate(parsed_posts):
             tweet_number = f"#{i + 1}"
             tweet_container = page.locator(f'div[data-atom-index="{i}"]')
 
             # --- UPLOAD IMAGE FROM GOOGLE DRIVE ---
-            split_result = post_content.split('[')
-            if len(split_result) > 1:
-                image_tag = split_result[1].replace(']', '').strip()
-                image_path = os.path.join(downloads_dir, image_tag)
-                
-                # Download image from Google Drive
-                if not download_gdrive_file(folder_url, image_tag, image_path, drive_service):
-                    logger.error(f"Failed to download image '{image_tag}' for {tweet_number}. Aborting.")
-                    page.screenshot(path=f"error_download_{tweet_number}.png")
-                    sys.exit(1)
+            if image_tag:
+                if image_tag not in image_cache:
+                    # Wait for the background download of this image
+                    image_bytes = downloads.pop(image_tag).result()
+                    if image_bytes is None:
+                        logger.error(f"Failed to download image '{image_tag}' for {tweet_number}. Aborting.")
+                        page.screenshot(path=f"error_download_{tweet_number}.png")
+                        sys.exit(1)
+                    image_cache[image_tag] = {
+                        "name": image_tag,
+                        "mimeType": mimetypes.guess_type(image_tag)[0] or "application/octet-stream",
+                        "buffer": image_bytes,
+                    }
 
                 try:
                     with page.expect_file_chooser(timeout=30000) as fc_info:
@@ -187,56 +314,62 @@ def automate_typefully(posts, folder_url: str):
                         media_button_icon = tweet_container.locator('button:has(svg > rect[x="3"])')
                         media_button_icon.wait_for(state="visible", timeout=5000)
                         media_button_icon.click()
-                        page.wait_for_timeout(1000)
                         upload_menu_item = page.get_by_role("menuitem", name="Upload images or video")
+                        upload_menu_item.wait_for(state="visible", timeout=5000)
                         upload_menu_item.click(force=True)
                     
                     file_chooser = fc_info.value
-                    file_chooser.set_files(image_path)
+                    file_chooser.set_files(image_cache[image_tag])
                     
                     uploaded_image_preview = tweet_container.locator('img').nth(1)
                     uploaded_image_preview.wait_for(state="visible", timeout=20000)
 
-                    # Clean up downloaded image
-                    os.remove(image_path)
-                    logger.info(f"Deleted temporary file: {image_path}")
-
                 except Exception as e:
                     logger.error(f"Error during image upload for {tweet_number}: {str(e)}")
                     page.screenshot(path=f"error_media_{tweet_number}.png")
                     raise
 
             # --- TEXT INPUT ---
-            text_to_type = split_result[0].strip() if len(split_result) > 1 else post_content
             try:
                 text_area_container = tweet_container.locator('div[data-node-view-content]').first
                 text_area_container.click()
-                page.wait_for_timeout(500)
-                page.keyboard.type(text_to_type, delay=50)
+                page.wait_for_function(
+                    # Focus must be inside the tweet's own editor, not just anywhere on <body>
+                    "el => (el.closest('[contenteditable=\"true\"]') || el).contains(document.activeElement)",
+                    arg=text_area_container.element_handle(),
+                    timeout=5000,
+                )
+                page.keyboard.insert_text(text_to_type)
+                page.wait_for_function(
+                    '([el, text]) => el.textContent.replace(/\\s+/g, "") === text.replace(/\\s+/g, "")',
+                    arg=[text_area_container.element_handle(), text_to_type],
+                    timeout=5000,
+                )
             except Exception as e:
                 logger.error(f"Error typing text for {tweet_number}: {str(e)}")
                 page.screenshot(path=f"error_typing_{tweet_number}.png")
                 raise
 
             # --- ADD A NEW TWEET ---
+            # Each tweet needs its own data-atom-index editor for its image upload, so
+            # tweets are added one at a time with their button; waiting for the new
+            # editor is the only pause needed
             if i < len(posts) - 1:
                 add_tweet_button = tweet_container.locator('button:has(svg > path[d="M4 5H20"])')
                 add_tweet_button.click()
                 page.locator(f'div[data-atom-index="{i + 1}"]').wait_for(state="visible", timeout=10000)
-                page.wait_for_timeout(1000)
 
         # --- Publishing ---
         page.get_by_role("button", name="Publish", exact=True).click()
-        page.wait_for_timeout(5000)
-        page.get_by_role("button", name="Publish now").click()
-        page.wait_for_timeout(10000)
+        publish_now_button = page.get_by_role("button", name="Publish now")
+        publish_now_button.wait_for(state="visible", timeout=15000)
+        publish_now_button.click()
+        publish_now_button.wait_for(state="detached", timeout=30000)
 
-        context.close()
-        browser.close()
+        page.close()
 
 # --- Main Execution Block ---
 if __name__ == "__main__":
-    AUTH_FILE = "auth.json"
     folder_url = os.getenv("GOOGLE_DRIVE_FOLDER_URL")
     posts = [
         "First post text, which is nice [image.jpg]",
@@ -247,10 +380,18 @@ if __name__ == "__main__":
         if not folder_url:
             logger.error("GOOGLE_DRIVE_FOLDER_URL not set in .env file.")
             sys.exit(1)
-        if os.path.isfile(AUTH_FILE):
-            automate_typefully(posts, folder_url)
-        else:
-            perform_login(AUTH_FILE)
+        # The browser only needs a window when someone has to watch the first login,
+        # after which the same page goes straight on to posting
+        first_run = not os.path.isdir(PROFILE_DIR)
+        # Get the Drive token (DNS, TLS and an OAuth round-trip) while Chromium starts
+        threading.Thread(target=_prewarm_drive, daemon=True).start()
+        from playwright.sync_api import sync_playwright
+
+        with sync_playwright() as p:
+            context = launch_context(p, headless=not first_run)
+            page = perform_login(context) if first_run else None
+            automate_typefully(context, posts, folder_url, page)
+            context.close()
     except Exception as e:
         logger.error(f"An error occurred during the process: {str(e)}")
     finally: